@@ -1,12 +1,62 @@
 import os
+from dataclasses import dataclass
+from functools import cache
+from types import MappingProxyType
+from typing import Any, Mapping
 
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_NAME = os.getenv("DB_NAME")
 
-SCRAPE_START_URL = os.getenv("SCRAPE_START_URL", "https://auto.ria.com/uk/car/used/")
-MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))
-MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "5"))
-MAX_PAGES_TO_SCRAPE = 0
+def _parse_bool(value: str | None, default: bool = False) -> bool:
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+@cache
+def _cfg() -> Mapping[str, Any]:
+    """
+    Read all environment variables once and freeze them.
+    Values are fixed at import time; later changes to os.environ are not picked up.
+    """
+    return MappingProxyType({
+        "DB_HOST": os.getenv("DB_HOST"),
+        # An empty DB_PORT= falls back to the default instead of failing int("")
+        "DB_PORT": int(os.getenv("DB_PORT") or 5432),
+        "DB_USER": os.getenv("DB_USER"),
+        "DB_PASSWORD": os.getenv("DB_PASSWORD"),
+        "DB_NAME": os.getenv("DB_NAME"),
+        "SCRAPE_START_URL": os.getenv("SCRAPE_START_URL", "https://auto.ria.com/uk/car/used/"),
+        "MAX_RETRIES": int(os.getenv("MAX_RETRIES", "3")),
+        "MAX_CONCURRENCY": int(os.getenv("MAX_CONCURRENCY", "5")),
+        "MAX_PAGES_TO_SCRAPE": 0,
+        "TZ": os.getenv("TZ", "Europe/Kyiv"),
+        "SCRAPE_TIME": os.getenv("SCRAPE_TIME", "12:00"),
+        "DUMP_TIME": os.getenv("DUMP_TIME", "12:00"),
+        "RUN_ON_STARTUP": _parse_bool(os.getenv("RUN_ON_STARTUP")),
+        "PG_DUMP_JOBS": int(os.getenv("PG_DUMP_JOBS", str(min(os.cpu_count() or 1, 8)))),
+        "DUMP_COMPRESSOR": os.getenv("DUMP_COMPRESSOR", "zstd").strip().lower(),
+        "DUMP_COMPRESS_LEVEL": int(os.getenv("DUMP_COMPRESS_LEVEL", "3")),
+    })
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    db_host: str | None
+    db_port: int
+    db_user: str | None
+    db_password: str | None
+    db_name: str | None
+    scrape_start_url: str
+    max_retries: int
+    max_concurrency: int
+    max_pages_to_scrape: int
+    tz: str
+    scrape_time: str  # "HH:MM"
+    dump_time: str  # "HH:MM"
+    run_on_startup: bool
+    pg_dump_jobs: int
+    dump_compressor: str  # "zstd", "pigz" or "none"
+    dump_compress_level: int
+
+
+# The single way to read settings: CONFIG.<field>
+CONFIG = Config(**{name.lower(): value for name, value in _cfg().items()})
@@ -1,14 +1,20 @@
 import os
 import asyncio
+import operator
 import logging
+import shutil
+from contextlib import AbstractAsyncContextManager
 from datetime import datetime, UTC
 from pathlib import Path
-from typing import Iterable, Mapping, Any
-from dataclasses import is_dataclass, asdict
+from typing import Any, Callable, Iterable, Mapping
+from dataclasses import is_dataclass
 
 import psycopg
+from psycopg import sql
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
 
-from .config import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME
+from .config import CONFIG
 from .models import CarListing
 
 CREATE_TABLE = """
@@ -26,91 +32,243 @@ CREATE_TABLE = """
         datetime_found TIMESTAMPTZ NOT NULL
         );
         """
-LISTING_INSERT = """
+COLUMNS = (
+    "url", "title", "price_usd", "odometer", "username", "phone_number",
+    "image_url", "images_count", "car_number", "car_vin", "datetime_found",
+)
+# Both run their loop over COLUMNS in C and return the row tuple directly.
+_EXTRACT_ATTRS = operator.attrgetter(*COLUMNS)
+_EXTRACT_ITEMS = operator.itemgetter(*COLUMNS)
+# Binary COPY needs the exact PostgreSQL type of every column, in COLUMNS order.
+COPY_TYPES = (
+    "text", "text", "int4", "int4", "text", "int8",
+    "text", "int4", "text", "text", "timestamptz",
+)
+# Below this many rows a single multi-row INSERT is cheaper than staging + COPY.
+COPY_THRESHOLD = 100
+
+LISTING_INSERT = sql.SQL("""
+          INSERT INTO car_listings ({columns})
+          VALUES {rows}
+          ON CONFLICT (url) DO NOTHING;
+          """)
+LISTING_ROW = sql.SQL("({})").format(sql.SQL(", ").join(sql.Placeholder() * len(COLUMNS)))
+CREATE_STAGE = """
+          CREATE TEMP TABLE car_listings_stage
+            (LIKE car_listings INCLUDING DEFAULTS)
+            ON COMMIT DROP;
+          """
+STAGE_COPY = sql.SQL("COPY car_listings_stage ({columns}) FROM STDIN WITH (FORMAT BINARY)")
+STAGE_MERGE = """
           INSERT INTO car_listings
-            (url, title, price_usd, odometer, username, phone_number,
-             image_url, images_count, car_number, car_vin, datetime_found)
-          VALUES
-            (%(url)s, %(title)s, %(price_usd)s, %(odometer)s, %(username)s, %(phone_number)s,
-             %(image_url)s, %(images_count)s, %(car_number)s, %(car_vin)s, %(datetime_found)s)
+          SELECT * FROM car_listings_stage
           ON CONFLICT (url) DO NOTHING;
           """
+# Up to this many URLs a single ANY() lookup beats creating, filling and joining a temp table.
+URL_PROBE_THRESHOLD = 1000
+URLS_EXISTING = "SELECT url FROM car_listings WHERE url = ANY(%s)"
+CREATE_URL_PROBE = """
+          CREATE TEMP TABLE url_probe (url TEXT PRIMARY KEY) ON COMMIT DROP;
+          """
+URL_PROBE_COPY = "COPY url_probe (url) FROM STDIN WITH (FORMAT BINARY)"
+URL_PROBE_NEW = """
+          SELECT p.url FROM url_probe p
+          LEFT JOIN car_listings c USING (url)
+          WHERE c.url IS NULL;
+          """
+
+# Multithreaded compressors for the dump archive: command template for tar -I and file suffix.
+DUMP_COMPRESSORS = {
+    "zstd": ("zstd -T0 -{level}", ".tar.zst"),
+    "pigz": ("pigz -{level}", ".tar.gz"),
+}
+
+
+_EXTRACTORS: dict[type, Callable[[Any], tuple[Any, ...]]] = {}
+
+
+def _row_extractor(cls: type) -> Callable[[Any], tuple[Any, ...]]:
+    """
+    Pick the function that turns a listing of the given type into a row tuple in COLUMNS order.
+    The choice is cached per type, so type checks run once per process rather than per row.
+    """
+    extract = _EXTRACTORS.get(cls)
+    if extract is not None:
+        return extract
+    if issubclass(cls, Mapping):
+        extract = _EXTRACT_ITEMS
+    elif hasattr(cls, "model_dump") or is_dataclass(cls):
+        extract = _EXTRACT_ATTRS
+    else:
+        raise TypeError(f"Unsupported listing type: {cls!r}")
+    _EXTRACTORS[cls] = extract
+    return extract
+
+
+# Shared by every DB instance; opened lazily by DB.init_db().
+# prepare_threshold makes the hot INSERT/SELECT statements server-side prepared after a few runs.
+POOL = AsyncConnectionPool(
+    conninfo=make_conninfo(
+        host=CONFIG.db_host,
+        port=CONFIG.db_port,
+        dbname=CONFIG.db_name,
+        user=CONFIG.db_user,
+        password=CONFIG.db_password,
+    ),
+    min_size=2,
+    max_size=max(CONFIG.max_concurrency, 2),
+    kwargs={"prepare_threshold": 5},
+    open=False,
+)
 
 
 class DB:
     DUMPS_DIR = Path("dumps")
 
     @staticmethod
-    def _connect() -> psycopg.Connection:
-        return psycopg.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-        )
+    def _connect() -> AbstractAsyncContextManager[psycopg.AsyncConnection]:
+        """Borrow a connection from the shared pool; it is returned on context exit."""
+        return POOL.connection()
+
+    async def init_db(self) -> None:
+        await POOL.open(wait=True)
+        async with self._connect() as conn, conn.cursor() as cur:
+            await cur.execute(CREATE_TABLE)
+            await conn.commit()
+
+    async def close(self) -> None:
+        """Close the shared connection pool."""
+        await POOL.close()
+
+    async def urls_not_in_db(self, urls: Iterable[str]) -> list[str]:
+        """
+        Return the given URLs that are not stored yet, in their original order.
+        Small lists (one search page) take a single ANY() lookup. Large ones are streamed with binary COPY
+        into a temp table and anti-joined against car_listings, which is cheaper than a huge array literal.
+        """
+        unique = list(dict.fromkeys(urls))
+        if not unique:
+            return []
+        if len(unique) <= URL_PROBE_THRESHOLD:
+            async with self._connect() as conn, conn.cursor() as cur:
+                await cur.execute(URLS_EXISTING, (unique,))
+                existing = {row[0] for row in await cur.fetchall()}
+            return [url for url in unique if url not in existing]
+        async with self._connect() as conn, conn.cursor() as cur:
+            await cur.execute(CREATE_URL_PROBE)
+            async with cur.copy(URL_PROBE_COPY) as cp:
+                cp.set_types(["text"])
+                for url in unique:
+                    await cp.write_row((url,))
+            await cur.execute(URL_PROBE_NEW)
+            new_urls = [row[0] for row in await cur.fetchall()]
+            await conn.commit()
+        return new_urls
+
+    async def insert_batch(self, listings: Iterable[CarListing]) -> None:
+        """
+        Insert a batch of listings into the database.
+        Large batches are streamed with binary COPY into a temp staging table and merged
+        with ON CONFLICT, small ones go as a single multi-row INSERT.
+        """
 
-    def init_db(self) -> None:
-        with self._connect() as conn, conn.cursor() as cur:
-            cur.execute(CREATE_TABLE)
-            conn.commit()
-
-    def existing_urls(self, urls: list[str]) -> set[str]:
-        """ Check which of the given URLs already exist in the database. """
-        if not urls:
-            return set()
-        query = "SELECT url FROM car_listings WHERE url = ANY(%s)"
-        with self._connect() as conn, conn.cursor() as cur:
-            cur.execute(query, (urls,))
-            return {row[0] for row in cur.fetchall()}
-
-    def insert_batch(self, listings: Iterable[CarListing]) -> None:
-        """ Insert a batch of listings into the database. """
-
-        def serialize(listing: CarListing) -> None | dict[str, Any]:
-            """Helper to convert various types to dict."""
+        def serialize(listing: CarListing) -> None | tuple[Any, ...]:
+            """Helper to convert various types to a row tuple in COLUMNS order."""
             if listing is None: return None
-            if isinstance(listing, Mapping): return dict(listing)
-            if hasattr(listing, "model_dump"): return listing.model_dump()
-            if is_dataclass(listing): return asdict(listing)
-            raise TypeError(f"Unsupported listing type: {type(listing)!r}")
+            return _row_extractor(type(listing))(listing)
 
-        params = [p for p in map(serialize, listings) if p is not None]
+        rows = [r for r in map(serialize, listings) if r is not None]
 
-        if not params:
+        if not rows:
             return
 
-        with self._connect() as conn, conn.cursor() as cur:
-            cur.executemany(LISTING_INSERT, params)
-            conn.commit()
+        if len(rows) >= COPY_THRESHOLD:
+            await self._copy_rows(rows)
+            return
 
-    async def create_dump(self) -> None:
-        """Create a backup dump of the database using pg_dump."""
-        filename = f"dump_{datetime.now(UTC):%Y%m%d_%H%M%S}.dump"
-        output_path = self.DUMPS_DIR / filename
-        logging.info(f"Creating backup to DB: {filename}")
-        cmd = [
-            "pg_dump",
-            "--format=custom",
-            "--file", str(output_path),
-            "--host", DB_HOST,
-            "--port", str(DB_PORT),
-            "--username", DB_USER,
-            DB_NAME,
-        ]
-        env = os.environ.copy()
-        if DB_PASSWORD:
-            env["PGPASSWORD"] = DB_PASSWORD
+        query = LISTING_INSERT.format(
+            columns=sql.SQL(", ").join(map(sql.Identifier, COLUMNS)),
+            rows=sql.SQL(", ").join([LISTING_ROW] * len(rows)),
+        )
+        async with self._connect() as conn, conn.cursor() as cur:
+            await cur.execute(query, [value for row in rows for value in row])
+            await conn.commit()
 
+    async def _copy_rows(self, rows: Iterable[tuple[Any, ...]]) -> None:
+        """COPY rows into a temp staging table and merge them into car_listings, skipping known URLs."""
+        columns = sql.SQL(", ").join(map(sql.Identifier, COLUMNS))
+        async with self._connect() as conn, conn.cursor() as cur:
+            await cur.execute(CREATE_STAGE)
+            async with cur.copy(STAGE_COPY.format(columns=columns)) as cp:
+                cp.set_types(COPY_TYPES)
+                for row in rows:
+                    await cp.write_row(row)
+            await cur.execute(STAGE_MERGE)
+            await conn.commit()
+
+    @staticmethod
+    async def _run_command(name: str, cmd: list[str], env: Mapping[str, str] | None = None) -> None:
+        """Run an external command without blocking the event loop, raising on a non-zero exit code."""
         proc = await asyncio.create_subprocess_exec(
             *cmd,
             env=env,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
         )
-        stdout, stderr = await proc.communicate()
+        try:
+            stdout, stderr = await proc.communicate()
+        except asyncio.CancelledError:
+            # Don't leave the command running on its own after shutdown.
+            proc.kill()
+            await proc.wait()
+            raise
 
         if proc.returncode != 0:
             raise RuntimeError(
-                f"Backup failed with code {proc.returncode}: {stderr.decode(errors='replace')}")
+                f"{name} failed with code {proc.returncode}: {stderr.decode(errors='replace')}")
+
+    async def create_dump(self) -> None:
+        """
+        Create a backup dump of the database using pg_dump.
+        Tables are dumped in parallel (PG_DUMP_JOBS) into a directory-format dump,
+        which is then packed into a single tar file compressed with DUMP_COMPRESSOR on all cores.
+        With DUMP_COMPRESSOR=none pg_dump's own single-threaded compression is used instead.
+        """
+        compressor = DUMP_COMPRESSORS.get(CONFIG.dump_compressor)
+        if compressor is None and CONFIG.dump_compressor != "none":
+            raise ValueError(f"Unsupported DUMP_COMPRESSOR: {CONFIG.dump_compressor!r}")
+
+        name = f"dump_{datetime.now(UTC):%Y%m%d_%H%M%S}"
+        dump_dir = self.DUMPS_DIR / f"{name}.dir"
+        output_path = self.DUMPS_DIR / f"{name}{compressor[1] if compressor else '.tar'}"
+        logging.info(f"Creating backup to DB: {output_path.name}")
+        cmd = [
+            "pg_dump",
+            "--format=directory",
+            f"--jobs={CONFIG.pg_dump_jobs}",
+            "--file", str(dump_dir),
+            "--host", CONFIG.db_host,
+            "--port", str(CONFIG.db_port),
+            "--username", CONFIG.db_user,
+            CONFIG.db_name,
+        ]
+        archive_cmd = ["tar", "-cf", str(output_path), "-C", str(self.DUMPS_DIR), dump_dir.name]
+        if compressor:
+            # Compression happens once, in parallel, on the archive.
+            cmd.insert(1, "--compress=0")
+            archive_cmd[1:1] = ["-I", compressor[0].format(level=CONFIG.dump_compress_level)]
+        env = os.environ.copy()
+        if CONFIG.db_password:
+            env["PGPASSWORD"] = CONFIG.db_password
+
+        try:
+            await self._run_command("Backup", cmd, env)
+            await self._run_command("Archive", archive_cmd)
+        except BaseException:
+            # A failed or cancelled dump must not leave a truncated archive behind.
+            output_path.unlink(missing_ok=True)
+            raise
+        finally:
+            # The directory is only an intermediate step; keep just the archive.
+            await asyncio.to_thread(shutil.rmtree, dump_dir, ignore_errors=True)
         logging.info(f"Dump created: {output_path}")
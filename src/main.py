@@ -15,7 +15,7 @@ async def main() -> None:
         format="%(asctime)s %(levelname)s %(name)s: %(message)s",
     )
     db = DB()
-    db.init_db()
+    await db.init_db()
     scraper = Scraper()
 
     async def run_scrape():
@@ -26,8 +26,20 @@ async def main() -> None:
 
     scheduler = AppScheduler(cfg, run_scrape=run_scrape, run_dump=run_dump)
     scheduler.start()
-    await scheduler.run_forever()
+    try:
+        await scheduler.run_forever()
+    finally:
+        # Jobs still using the process pool or the DB pool must be done before those close.
+        await scheduler.shutdown()
+        scraper.close()
+        await db.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # libuv-based loop, cheaper wakeups for many concurrent keep-alive requests; not available on Windows
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
@@ -1,8 +1,19 @@
+from contextvars import ContextVar
 from datetime import datetime, UTC
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+
+# Set once per scraped page so every listing of that batch shares one timestamp.
+BATCH_NOW: ContextVar[datetime | None] = ContextVar("BATCH_NOW", default=None)
+
+
+def _found_now() -> datetime:
+    return BATCH_NOW.get() or datetime.now(UTC)
 
 
 class CarListing(BaseModel):
+    # Listings are built once and only read afterwards.
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     url: str
     title: str
     price_usd: int | None
@@ -13,4 +24,4 @@ class CarListing(BaseModel):
     images_count: int
     car_number: str | None
     car_vin: str | None
-    datetime_found: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    datetime_found: datetime = Field(default_factory=_found_now)
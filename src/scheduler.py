@@ -1,18 +1,22 @@
 from __future__ import annotations
 
-import os
 import asyncio
 import logging
+import signal
+from contextlib import suppress
 from dataclasses import dataclass
+from datetime import time
 from zoneinfo import ZoneInfo
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
+from .config import CONFIG
+
 log = logging.getLogger(__name__)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ScheduleConfig:
     tz: str
     scrape_time: str  # "HH:MM"
@@ -20,34 +24,23 @@ class ScheduleConfig:
     run_on_startup: bool
 
 
-def parse_bool(value: str | None, default: bool = False) -> bool:
-    if value is None:
-        return default
-    return value.strip().lower() in {"1", "true", "yes", "on"}
-
-
 def load_config_from_env() -> ScheduleConfig:
-    tz = os.getenv("TZ", "Europe/Kyiv")
-    scrape_time = os.getenv("SCRAPE_TIME", "12:00")
-    dump_time = os.getenv("DUMP_TIME", "12:00")
-    run_on_startup = parse_bool(os.getenv("RUN_ON_STARTUP"), default=False)
-
     return ScheduleConfig(
-        tz=tz,
-        scrape_time=scrape_time,
-        dump_time=dump_time,
-        run_on_startup=run_on_startup,
+        tz=CONFIG.tz,
+        scrape_time=CONFIG.scrape_time,
+        dump_time=CONFIG.dump_time,
+        run_on_startup=CONFIG.run_on_startup,
     )
 
 def _parse_hhmm(value: str) -> tuple[int, int]:
-    # strict "HH:MM"
+    # strict "HH:MM"; fromisoformat alone would also accept "HH", "HHMM" and seconds
     if len(value) != 5 or value[2] != ":":
         raise ValueError(f"Invalid time format: {value} (expected HH:MM)")
-    hh = int(value[:2])
-    mm = int(value[3:])
-    if not (0 <= hh <= 23 and 0 <= mm <= 59):
-        raise ValueError(f"Invalid time: {value}")
-    return hh, mm
+    try:
+        t = time.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid time: {value}") from None
+    return t.hour, t.minute
 
 
 class AppScheduler:
@@ -68,6 +61,10 @@ class AppScheduler:
 
         # Locks to avoid overlapping runs
         self._lock = asyncio.Lock()
+        # Set by stop(); run_forever sleeps on it instead of polling
+        self._stop_event = asyncio.Event()
+        # Job tasks running or waiting for the lock; cancelled and awaited by shutdown()
+        self._jobs: set[asyncio.Task] = set()
 
     async def _guarded(self, name: str, coro, *, wait: bool) -> None:
         """
@@ -75,19 +72,26 @@ class AppScheduler:
         - wait=False: if locked -> skip (good for SCRAPE)
         - wait=True:  if locked -> wait until free (good for DUMP)
         """
-        if self._lock.locked() and not wait:
+        if not wait and self._lock.locked():
             log.warning("%s skipped: job already running", name)
             return
 
+        # There is no await between the check above and acquiring the lock, and asyncio never
+        # preempts, so no other job can take the lock in between: a free lock is acquired at once.
         # If wait=True, we intentionally queue behind the current job.
-        async with self._lock:
-            log.info("%s started", name)
-            try:
-                await coro()
-            except Exception as ex:
-                log.exception("%s failed: %s", name, ex)
-            finally:
-                log.info("%s finished", name)
+        task = asyncio.current_task()
+        self._jobs.add(task)
+        try:
+            async with self._lock:
+                log.info("%s started", name)
+                try:
+                    await coro()
+                except Exception as ex:
+                    log.exception("%s failed: %s", name, ex)
+                finally:
+                    log.info("%s finished", name)
+        finally:
+            self._jobs.discard(task)
 
     async def _scrape_job(self) -> None:
         await self._guarded("SCRAPE", self.run_scrape, wait=False)
@@ -123,10 +127,36 @@ class AppScheduler:
         log.info("Scheduler started (tz=%s, scrape=%s, dump=%s)",
                  self.cfg.tz, self.cfg.scrape_time, self.cfg.dump_time)
 
+    def stop(self) -> None:
+        """ Shut down the scheduler and make run_forever return. Safe to call more than once. """
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        self._stop_event.set()
+
     async def run_forever(self) -> None:
-        """ Run the scheduler indefinitely. If configured, also run the scrape job immediately on startup. """
+        """ Run the scheduler until stop() is called or SIGINT/SIGTERM is received. If configured, also run the scrape job immediately on startup. """
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            # Not available on Windows event loops; Ctrl+C still raises KeyboardInterrupt there.
+            with suppress(NotImplementedError):
+                loop.add_signal_handler(sig, self.stop)
+
         if self.cfg.run_on_startup:
-            asyncio.create_task(self._scrape_job())
+            self._jobs.add(asyncio.create_task(self._scrape_job()))
+
+        await self._stop_event.wait()
+        await self.shutdown()
+        log.info("Scheduler stopped")
 
-        while True:
-            await asyncio.sleep(3600)
+    async def shutdown(self) -> None:
+        """
+        Stop the scheduler, then cancel running and queued jobs and wait until they have finished cleaning up,
+        so the resources they use can be closed safely afterwards. Safe to call more than once.
+        """
+        self.stop()
+        jobs = list(self._jobs)
+        for job in jobs:
+            job.cancel()
+        if jobs:
+            log.info("Waiting for %s running job(s) to stop", len(jobs))
+            await asyncio.gather(*jobs, return_exceptions=True)
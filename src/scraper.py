@@ -1,32 +1,116 @@
 import asyncio
 import math
+import multiprocessing
+import os
+import random
 import re
+import string
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, UTC
+from functools import cache
+from html import unescape
 
 import aiohttp
+import orjson
 from bs4 import BeautifulSoup
 
-from .config import (
-    SCRAPE_START_URL,
-    MAX_RETRIES,
-    MAX_CONCURRENCY,
-    MAX_PAGES_TO_SCRAPE
-)
-from typing import List, Optional
-from .models import CarListing
+from .config import CONFIG
+from .database import COPY_THRESHOLD
+from typing import Any, Callable, List, Optional
+from .models import BATCH_NOW, CarListing
 
 AD_PER_PAGE = 20
+# Retry delays in seconds: RETRY_BACKOFF doubles per attempt up to RETRY_BACKOFF_MAX, plus up to RETRY_JITTER
+RETRY_BACKOFF = 1.0
+RETRY_BACKOFF_MAX = 20.0
+RETRY_JITTER = 1.0
+# Scraped listings are written to the DB once at least this many have piled up;
+# matching COPY_THRESHOLD makes every regular flush take the binary COPY path
+DB_FLUSH_SIZE = COPY_THRESHOLD
+# Larger responses are not listing pages worth parsing
+MAX_HTML_BYTES = 4 * 1024 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+
+# Phone popUp API request body, pre-serialized; fill with (autoId, userId, phoneId, userId, phoneId).
+# The IDs come from \d+ matches, so they never need JSON escaping.
+_PHONE_PAYLOAD_TEMPLATE = (
+    '{"blockId":"autoPhone","popUpId":"autoPhone","autoId":%d,'
+    '"data":[["userId","%s"],["phoneId","%s"],["userName","Продавець"],'
+    '["srcAnalytic","main_side_sellerInfo_sellerInfoPhone_showBottomPopUp"]],'
+    '"params":{"userId":"%s","phoneId":"%s"},"langId":4,"device":"desktop-web"}'
+)
+# Start URL with any page=N removed, and the separator for appending our own page parameter
+_SEARCH_BASE_URL = re.sub(r"([?&])page=\d+&?", r"\1", CONFIG.scrape_start_url).rstrip("?&")
+_SEARCH_PAGE_SEP = "&" if "?" in _SEARCH_BASE_URL else "?"
+# Listing page fields, searched in the raw HTML / embedded JS state
+_RESULTS_COUNT_RE = re.compile(r"window\.ria\.server\.resultsCount\s*=\s*Number\((\d+)\)")
+# All JSON-ish fields in one alternation, so the page is scanned once; each group is named after its field
+_LISTING_RE = re.compile(
+    r'"usd"\s*:\s*(?P<usd>\d+)'
+    r'|"priceUSD"\s*:\s*(?P<priceUSD>\d+)'
+    r'|"price"\s*:\s*(?P<price>\d+)'
+    r'|"raceInt"\s*:\s*(?P<raceInt>\d+)'
+    r'|"odometer"\s*:\s*(?P<odometer>\d+)'
+    r'|"userName"\s*:\s*"(?P<userName>[^"]+)"'
+    r'|"userId"\s*:\s*(?P<userId>\d+)'
+    r'|"phoneId"\s*:\s*"(?P<phoneId>\d+)"'
+    r'|"vin"\s*:\s*"(?P<vin>[A-Z0-9]{17})"'
+)
+# First <h1> in the raw HTML; group 2 is set only when its text runs straight to </h1>, with no nested tags
+_TITLE_RE = re.compile(r"<h1\b[^>]*>([^<]*)<(/h1>)?", re.IGNORECASE)
+# Text of the <strong> inside the .price_value block, like "11 тис. $"
+_PRICE_TAG_RE = re.compile(r'class="(?:[^"]*\s)?price_value(?:\s[^"]*)?"[^>]*>\s*<strong[^>]*>([^<]+)</strong>')
+_ODO_TEXT_RE = re.compile(r"(\d+)\s*тис\.\s*км")
+# ASCII digits only: the id goes straight into int() and the JSON payload
+_AUTOID_RE = re.compile(r"_(\d+)\.html", re.ASCII)
+_IMAGE_RE = re.compile(r'"large":"(https://cdn\d+\.riastatic\.com/photosnew/auto/photo/.*?hd\.webp)"')
+_CAR_NUMBER_RE = re.compile(r"\(([А-ЯA-Z]{2}\d{4}[А-ЯA-Z]{2})\)")
+# href of every <a> whose class list includes m-link-ticket, whatever the attribute order or quote style.
+# The lookbehinds keep data-href= / data-class= and the like from matching.
+_SEARCH_HREF_RE = re.compile(
+    r"""<a\b(?=[^>]*(?<![\w:-])class\s*=\s*["'](?:[^"']*\s)?m-link-ticket[\s"'])"""
+    r"""[^>]*?(?<![\w:-])href\s*=\s*["']([^"']+)["']"""
+)
+# Listing link, absolute or site-relative; group 1 is the path without query or fragment
+_LISTING_URL_RE = re.compile(r"(?:https?://auto\.ria\.com)?(/uk/auto_[^\"'#?]+?\.html)")
 
 
 class Scraper:
     """Main Scraper class to handle fetching and parsing of auto listings from auto.ria.com."""
 
+    __slots__ = ("headers", "phone_headers", "timeout", "_active", "_cap", "_cv", "_connector_kwargs", "_pool")
+
     def __init__(self):
         self.headers = {
-            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+            "Accept-Language": "uk-UA,uk;q=0.9,en;q=0.8",
+        }
+        # Sent on top of the session headers; built once since every phone API call uses the same ones
+        self.phone_headers = {
+            "X-Ria-Source": "vue3-1.47.0",
+            "Content-Type": "application/json",
         }
         self.timeout = aiohttp.ClientTimeout(total=20)
-        self.sem = asyncio.Semaphore(MAX_CONCURRENCY)
+        # In-flight request slots; unlike a Semaphore, the limit can be changed at runtime with set_concurrency()
+        self._active = 0
+        self._cap = CONFIG.max_concurrency
+        self._cv = asyncio.Condition()
+        # Keep-alive connections and cached DNS for the many requests that all go to auto.ria.com.
+        self._connector_kwargs = dict(
+            limit=CONFIG.max_concurrency * 2,
+            limit_per_host=CONFIG.max_concurrency,
+            ttl_dns_cache=300,
+            keepalive_timeout=30,
+            enable_cleanup_closed=True,
+        )
+        # HTML parsing is CPU-bound; worker processes keep it off the event loop and the GIL.
+        # "spawn" avoids forking a process that already runs scheduler and pool threads.
+        # No more than MAX_CONCURRENCY listings are parsed at once, so more processes would only sit idle.
+        self._pool = ProcessPoolExecutor(
+            max_workers=min(os.cpu_count() or 1, CONFIG.max_concurrency),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
 
     # === TOTAL PAGES ===
     async def get_total_pages(self, session: aiohttp.ClientSession) -> int:
@@ -37,7 +121,7 @@ class Scraper:
         logging.info("Getting count pages from window.ria.server.resultsCount...")
 
         # Load the first page HTML to find the total results count.
-        html = await self._fetch(session, SCRAPE_START_URL + "?page=1")
+        html = await self._fetch(session, self._build_page_url(1))
 
         if not html:
             logging.error(
@@ -47,9 +131,7 @@ class Scraper:
 
         try:
             # Searching number in string window.ria.server.resultsCount = Number(312990);
-            match = re.search(
-                r"window\.ria\.server\.resultsCount\s*=\s*Number\((\d+)\)", html
-            )
+            match = _RESULTS_COUNT_RE.search(html)
 
             if match:
                 ads_count = int(match.group(1))
@@ -65,55 +147,103 @@ class Scraper:
 
     # === STABLE FETCH (aiohttp): retry + backoff ===
 
-    async def _fetch(self, session: aiohttp.ClientSession, url: str) -> str | None:
-        """Fetch a URL with retries and exponential backoff."""
-        backoff = 1.0
+    async def _acquire(self) -> None:
+        """Wait for a free request slot and take it."""
+        async with self._cv:
+            await self._cv.wait_for(lambda: self._active < self._cap)
+            self._active += 1
+
+    async def _release(self) -> None:
+        """Give a request slot back and wake one waiter."""
+        async with self._cv:
+            self._active -= 1
+            self._cv.notify(1)
+
+    async def set_concurrency(self, cap: int) -> None:
+        """
+        Change how many requests may be in flight at once.
+        Requests already running keep their slots; a lower limit only holds back new ones.
+        """
+        if cap < 1:
+            raise ValueError(f"Concurrency must be at least 1, got {cap}")
+        async with self._cv:
+            self._cap = cap
+            # A raised limit can admit several waiters at once, so wake all of them to re-check.
+            self._cv.notify_all()
 
-        for attempt in range(1, MAX_RETRIES + 1):
+    async def _fetch(self, session: aiohttp.ClientSession, url: str) -> str | None:
+        """Fetch a URL with retries and jittered exponential backoff between attempts."""
+        for attempt in range(1, CONFIG.max_retries + 1):
+            if attempt > 1:
+                # Only retries wait; the first request and the final give-up never sleep.
+                backoff = min(RETRY_BACKOFF * 2 ** (attempt - 2), RETRY_BACKOFF_MAX)
+                await asyncio.sleep(backoff + random.uniform(0, RETRY_JITTER))
             try:
-                async with self.sem:
-                    async with session.get(
-                            url, headers=self.headers, allow_redirects=True
-                    ) as resp:
+                # The slot covers only the request itself, never the backoff sleep before a retry.
+                await self._acquire()
+                try:
+                    async with session.get(url, allow_redirects=True) as resp:
                         status = resp.status
-                        raw = await resp.read()
+                        too_large = (resp.content_length or 0) > MAX_HTML_BYTES
+                        # Error bodies are never used, so only a successful response is read.
+                        raw = await self._read_capped(resp) if status == 200 and not too_large else b""
+                finally:
+                    await self._release()
                 if status in (429, 500, 502, 503, 504):
-                    await asyncio.sleep(backoff)
-                    backoff = min(backoff * 2, 20)
                     continue
                 if status != 200:
                     logging.info(f"Failed to fetch {url}: HTTP {status}")
                     return None
+                if too_large or raw is None:
+                    logging.info(f"Skip {url}: response larger than {MAX_HTML_BYTES} bytes")
+                    return None
+                # Pages are UTF-8; decoding directly skips aiohttp's charset detection in resp.text().
                 return raw.decode("utf-8", errors="replace")
             except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
-                await asyncio.sleep(backoff)
-                backoff = min(backoff * 2, 20)
                 logging.error(f"Error fetching {url} (attempt {attempt}): {ex}")
                 continue
 
         return None
 
+    @staticmethod
+    async def _read_capped(resp: aiohttp.ClientResponse) -> bytes | None:
+        """
+        Read the body in chunks, giving up as soon as it passes MAX_HTML_BYTES.
+        Covers chunked responses, whose size is not known from Content-Length up front.
+        """
+        chunks = []
+        total = 0
+        async for chunk in resp.content.iter_chunked(READ_CHUNK_BYTES):
+            total += len(chunk)
+            if total > MAX_HTML_BYTES:
+                return None
+            chunks.append(chunk)
+        return b"".join(chunks)
+
     # === SEARCH PAGE: fetch + parse urls ===
 
     async def fetch_search_page(
             self, session: aiohttp.ClientSession, page_num: int
     ) -> str:
         """Fetch a search results page HTML."""
-        url = f"{SCRAPE_START_URL}?page={page_num}"
-        return await self._fetch(session, url)
+        return await self._fetch(session, self._build_page_url(page_num))
+
+    @staticmethod
+    def _build_page_url(page: int) -> str:
+        """Search URL for the given page; SCRAPE_START_URL may already carry its own query string."""
+        return f"{_SEARCH_BASE_URL}{_SEARCH_PAGE_SEP}page={page}"
 
     @staticmethod
     async def parse_search_page(html: str) -> List[str]:
         """
         Extract listing URLs from a search results page.
         """
-        soup = BeautifulSoup(html, "html.parser")
-        links = soup.find_all("a", class_="m-link-ticket", href=True)
         return list(
             {
-                l["href"]
-                for l in links
-                if l["href"].startswith("https://auto.ria.com/uk/auto")
+                f"https://auto.ria.com{m.group(1)}"
+                for href in _SEARCH_HREF_RE.findall(html)
+                # Attribute values are HTML-escaped (&amp; etc.); BeautifulSoup used to decode them for us
+                if (m := _LISTING_URL_RE.match(unescape(href)))
             }
         )
 
@@ -124,36 +254,61 @@ class Scraper:
         return await self._fetch(session, url)
 
     @staticmethod
-    def _get_title(soup: BeautifulSoup) -> str:
-        """Extract title from the listing page."""
-        return soup.find("h1").get_text(strip=True) if soup.find("h1") else "Auto"
+    def _scan_listing(html: str) -> dict[str, str]:
+        """
+        Walk the HTML once with _LISTING_RE and return the first value found for each field,
+        keyed by group name, matching what a separate re.search per field would return.
+        """
+        found: dict[str, str] = {}
+        for m in _LISTING_RE.finditer(html):
+            found.setdefault(m.lastgroup, m.group(m.lastgroup))
+        return found
+
+    @staticmethod
+    def _get_title(html: str, make_soup: Callable[[], BeautifulSoup]) -> str:
+        """
+        Extract title from the listing page.
+        The regex answer is used only for a plain, non-empty <h1> outside <script> and comments;
+        anything else is left to the soup, as it sees the real document structure.
+        """
+        title_match = _TITLE_RE.search(html)
+        if not title_match:
+            return "Auto"
+        title = unescape(title_match.group(1)).strip()
+        if title and title_match.group(2) and not _in_script_or_comment(html, title_match.start()):
+            return title
+        h1 = make_soup().find("h1")
+        return h1.get_text(strip=True) if h1 else "Auto"
 
     @staticmethod
-    def _get_price_usd(html: str, soup: BeautifulSoup) -> int | None:
-        """Extract price in USD from HTML using regex and BeautifulSoup as fallback."""
+    def _get_price_usd(found: dict[str, str], html: str, make_soup: Callable[[], BeautifulSoup]) -> int | None:
+        """Extract price in USD from the scanned fields, with BeautifulSoup as fallback."""
         price_usd = 0
 
-        price_match = (
-                re.search(r'"usd"\s*:\s*(\d+)', html)
-                or re.search(r'"priceUSD"\s*:\s*(\d+)', html)
-                or re.search(r'"price"\s*:\s*(\d+)', html)
-        )
+        price = found.get("usd") or found.get("priceUSD") or found.get("price")
 
-        if price_match:
-            val = int(price_match.group(1))
+        if price:
+            val = int(price)
             # If price is small (like 11), it's likely not price.
             # If it's large (150000), it's already in full amount.
             if val > 100:
                 price_usd = val
             else:
                 # Try to find price in the text, like "11 тис. $"
-                price_tag = soup.select_one(".price_value strong")
-                if price_tag:
-                    price_usd = int(re.sub(r"\D", "", price_tag.get_text()))
+                price_text = None
+                if "price_value" in html:
+                    tag_match = _PRICE_TAG_RE.search(html)
+                    if tag_match:
+                        price_text = unescape(tag_match.group(1))
+                    elif price_tag := make_soup().select_one(".price_value strong"):
+                        price_text = price_tag.get_text()
+                if price_text:
+                    # Keep ASCII digits only; the text is short and mixes in Cyrillic
+                    price_usd = int("".join(c for c in price_text if c in string.digits))
         return price_usd if price_usd > 0 else None
 
     @staticmethod
-    def _get_odometer(html: str) -> int | None:
+    def _get_odometer(found: dict[str, str], html: str) -> int | None:
         """
         Extract odometer (mileage) from HTML using regex.
         Find raceInt of odometer. It can be in different formats, so we will try several regex patterns to find it.
@@ -161,72 +316,59 @@ class Scraper:
         """
         odometer = 0
 
-        odo_match = re.search(r'"raceInt"\s*:\s*(\d+)', html) or re.search(
-            r'"odometer"\s*:\s*(\d+)', html
-        )
-        if odo_match:
-            return int(odo_match.group(1))
+        odo = found.get("raceInt") or found.get("odometer")
+        if odo:
+            return int(odo)
         else:
             # Reserve search in text, like "150 тис. км"
-            text_odo = re.search(r"(\d+)\s*тис\.\s*км", html)
+            text_odo = _ODO_TEXT_RE.search(html) if "тис." in html else None
             if text_odo:
                 odometer = int(text_odo.group(1)) * 1000
         return odometer if odometer > 0 else None
 
     @staticmethod
-    def _get_username(html: str) -> str:
-        """Extract seller's name from HTML."""
-        username_match = re.search(r'"userName"\s*:\s*"([^"]+)"', html)
-        return username_match.group(1) if username_match else "Продавець"
+    def _get_username(found: dict[str, str]) -> str:
+        """Extract seller's name from the scanned fields."""
+        return found.get("userName", "Продавець")
 
-    async def _get_phone_number(
-            self, session: aiohttp.ClientSession, html: str, url: str
-    ) -> int | None:
+    @staticmethod
+    def _get_phone_ids(found: dict[str, str], url: str) -> tuple[str | None, str | None, str | None]:
         """
         Get userId, phoneId, autoId from HTML.
         It can be in PINIA or in the raw HTML as JavaScript variables.
         """
-        user_id_match = re.search(r'"userId"\s*:\s*(\d+)', html)
-        phone_id_match = re.search(r'"phoneId"\s*:\s*"(\d+)"', html)
-        auto_id_match = re.search(r"_(\d+)\.html", url)
+        auto_id_match = _AUTOID_RE.search(url)
 
-        user_id = user_id_match.group(1) if user_id_match else None
-        phone_id = phone_id_match.group(1) if phone_id_match else None
+        user_id = found.get("userId")
+        phone_id = found.get("phoneId")
         auto_id = auto_id_match.group(1) if auto_id_match else None
+        return user_id, phone_id, auto_id
 
+    async def _get_phone_number(
+            self,
+            session: aiohttp.ClientSession,
+            phone_ids: tuple[str | None, str | None, str | None],
+            url: str,
+    ) -> int | None:
+        """Request the seller's phone number from the popUp API using the IDs found on the listing page."""
+        user_id, phone_id, auto_id = phone_ids
         if not all([user_id, phone_id, auto_id]):
             logging.warning(f"Still no IDs for {url}: user={user_id}, phone={phone_id}")
             return None
 
         # Proceed to API call to get phone number using the extracted IDs.
-        payload = {
-            "blockId": "autoPhone",
-            "popUpId": "autoPhone",
-            "autoId": int(auto_id),
-            "data": [
-                ["userId", str(user_id)],
-                ["phoneId", str(phone_id)],
-                ["userName", "Продавець"],
-                ["srcAnalytic", "main_side_sellerInfo_sellerInfoPhone_showBottomPopUp"],
-            ],
-            "params": {"userId": str(user_id), "phoneId": str(phone_id)},
-            "langId": 4,
-            "device": "desktop-web",
-        }
+        # Only the IDs change between listings; the rest comes from the shared template.
+        payload = (_PHONE_PAYLOAD_TEMPLATE % (int(auto_id), user_id, phone_id, user_id, phone_id)).encode()
 
         api_url = "https://auto.ria.com/bff/final-page/public/auto/popUp/"
-        headers = {
-            **self.headers,
-            "X-Ria-Source": "vue3-1.47.0",
-            "Content-Type": "application/json",
-        }
 
         try:
-            async with session.post(api_url, json=payload, headers=headers) as resp:
+            async with session.post(api_url, data=payload, headers=self.phone_headers) as resp:
                 if resp.status == 200:
-                    data = await resp.json()
+                    data = orjson.loads(await resp.read())
                     res = data.get("additionalParams", {}).get("phoneStr", "")
-                    raw_phone = re.sub(r"\D", "", res)
+                    # Any separator may appear (spaces, brackets, en dashes), so keep ASCII digits only
+                    raw_phone = "".join(c for c in str(res) if c in string.digits)
                     if raw_phone.startswith("0") and len(raw_phone) == 10:
                         return int("38" + raw_phone)
         except Exception as ex:
@@ -236,99 +378,154 @@ class Scraper:
     @staticmethod
     def _get_images(html: str) -> tuple:
         """Extract first image URL and total image count from HTML."""
-        image_links = re.findall(
-            r'"large":"(https://cdn\d+\.riastatic\.com/photosnew/auto/photo/.*?hd\.webp)"',
-            html,
-        )
+        if '"large":"' not in html:
+            return None, 0
+        image_links = _IMAGE_RE.findall(html)
         return (image_links[0], len(image_links)) if image_links else (None, 0)
 
     @staticmethod
     def _get_car_number(html: str) -> str | None:
         """
         Extract car number (stateNumber) from HTML.
-        We will try several methods to find it, starting with the most reliable one (meta description), and then falling back to BeautifulSoup if needed.
+        We will try several methods to find it, starting with the most reliable one (meta description), and then falling back to the whole page if needed.
         """
-        # First try to find in meta description, where it is often in format "(ВН1234ЕК)". We
-        pattern = r"\(([А-ЯA-Z]{2}\d{4}[А-ЯA-Z]{2})\)"
-        number_match = re.search(pattern, html)
+        # First try to find in meta description, where it is often in format "(ВН1234ЕК)".
+        # Only that tag is searched; the whole page is the fallback when the page has no description.
+        idx = html.find('name="description"')
+        if idx >= 0:
+            start = html.rfind("<meta", 0, idx)
+            end = html.find(">", idx)
+            window = html[start if start >= 0 else idx:end if end >= 0 else idx + 600]
+        elif "(" in html:
+            window = html
+        else:
+            return None
+        number_match = _CAR_NUMBER_RE.search(window)
 
         if number_match:
             return number_match.group(1).strip()
         return None
 
     @staticmethod
-    def _get_car_vin(html: str) -> str | None:
-        """Extract VIN from HTML using regex."""
-        vin_match = re.search(r'"vin"\s*:\s*"([A-Z0-9]{17})"', html)
-        return vin_match.group(1) if vin_match else None
+    def _get_car_vin(found: dict[str, str]) -> str | None:
+        """Extract VIN from the scanned fields."""
+        return found.get("vin")
 
     async def parse_listing_page(
             self, session: aiohttp.ClientSession, html: str, url: str
     ) -> CarListing:
-        soup = BeautifulSoup(html, "html.parser")
-
-        title = self._get_title(soup)
-        price_usd = self._get_price_usd(html, soup)
-        odometer = self._get_odometer(html)
-        username = self._get_username(html)
-        phone_number = await self._get_phone_number(session, html, url)
-        image_url, images_count = self._get_images(html)
-        car_number = self._get_car_number(html)
-        car_vin = self._get_car_vin(html)
-
-        return CarListing(
-            url=url,
-            title=title,
-            price_usd=price_usd,
-            odometer=odometer,
-            username=username,
-            phone_number=phone_number,
-            image_url=image_url,
-            images_count=images_count,
-            car_number=car_number,
-            car_vin=car_vin,
-        )
+        """
+        Parse the page in the worker process pool so the event loop keeps serving fetches,
+        then look up the phone number (network I/O) here.
+        """
+        loop = asyncio.get_running_loop()
+        fields, phone_ids = await loop.run_in_executor(self._pool, parse_car_fields, html, url)
+        phone_number = await self._get_phone_number(session, phone_ids, url)
+
+        return CarListing(**fields, phone_number=phone_number)
+
+    def close(self) -> None:
+        """Stop the parser worker processes."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
 
     async def run(self, db) -> None:
         """Streamlined main method to run the scraper with database integration."""
         logging.info("Starting Scraper jobs...")
 
-        async with aiohttp.ClientSession() as session:
+        connector = aiohttp.TCPConnector(**self._connector_kwargs)
+        async with aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout, headers=self.headers
+        ) as session:
             # Get total pages to scan
             total_pages = await self.get_total_pages(session)
 
-            if MAX_PAGES_TO_SCRAPE > 0:
-                pages_to_scan = min(total_pages, MAX_PAGES_TO_SCRAPE)
+            if CONFIG.max_pages_to_scrape > 0:
+                pages_to_scan = min(total_pages, CONFIG.max_pages_to_scrape)
             else:
                 pages_to_scan = total_pages
 
             logging.info(f"Scanning {pages_to_scan} pages out of {total_pages} total available.")
 
-            for page_num in range(1, pages_to_scan + 1):
-                logging.info(f"=== Page parsing {page_num}/{pages_to_scan} ===")
-                # Get html of the search page
-                html = await self.fetch_search_page(session, page_num)
-                if not html:
-                    continue
-
-                # Get all listing URLs from the search page
-                all_urls = await self.parse_search_page(html)
-                existing = db.existing_urls(all_urls)
-                new_urls = [url for url in all_urls if url not in existing]
-                logging.info(f"Found {len(all_urls)} links, {len(existing)} already in DB, {len(new_urls)} new to process.")
-                if not new_urls:
-                    continue
-
-                tasks = [self._process_single_listing(session, url) for url in new_urls]
-                results = await asyncio.gather(*tasks)
-
-                batch = [r for r in results if r is not None]
-                if batch:
-                    db.insert_batch(batch)
-                    logging.info("Saved %s listings from page %s", len(batch), page_num)
+            # Scraped listings not written yet; flushed DB_FLUSH_SIZE or more at a time, between pages
+            unsaved: list[CarListing] = []
+            try:
+                async with asyncio.TaskGroup() as tg:
+                    next_html = tg.create_task(self.fetch_search_page(session, 1))
+                    for page_num in range(1, pages_to_scan + 1):
+                        logging.info(f"=== Page parsing {page_num}/{pages_to_scan} ===")
+                        # Get html of the search page, and start downloading the next one while this one is scraped
+                        html = await next_html
+                        if page_num < pages_to_scan:
+                            next_html = tg.create_task(self.fetch_search_page(session, page_num + 1))
+                        if not html:
+                            continue
+
+                        # Get all listing URLs from the search page.
+                        # Results shift between pages during a run, so skip listings scraped but not flushed yet too.
+                        all_urls = await self.parse_search_page(html)
+                        unsaved_urls = {listing.url for listing in unsaved}
+                        new_urls = [url for url in await db.urls_not_in_db(all_urls) if url not in unsaved_urls]
+                        logging.info(f"Found {len(all_urls)} links, {len(all_urls) - len(new_urls)} already in DB, {len(new_urls)} new to process.")
+                        if not new_urls:
+                            continue
+
+                        token = BATCH_NOW.set(datetime.now(UTC))
+                        try:
+                            await self._scrape_listings(session, new_urls, unsaved)
+                        finally:
+                            BATCH_NOW.reset(token)
+
+                        if len(unsaved) >= DB_FLUSH_SIZE:
+                            await self._save_listings(db, unsaved)
+
+                        # For stability
+                        # await asyncio.sleep(1.5)
+            finally:
+                # Also on errors and cancellation, so listings already scraped (and phone-looked-up) are kept
+                await self._save_listings(db, unsaved)
 
-                # For stability
-                # await asyncio.sleep(1.5)
+    @staticmethod
+    async def _save_listings(db, listings: list[CarListing]) -> None:
+        """Write the collected listings in one insert and empty the list."""
+        if not listings:
+            return
+        await db.insert_batch(listings)
+        logging.info("Saved %s listings", len(listings))
+        listings.clear()
+
+    async def _scrape_listings(
+            self,
+            session: aiohttp.ClientSession,
+            urls: list[str],
+            results: list[CarListing],
+    ) -> None:
+        """
+        Scrape listings with a fixed pool of workers, appending each parsed one to results.
+        At most MAX_CONCURRENCY listing pages are held in memory at once, however many URLs the page had.
+        """
+        pending: asyncio.Queue[str] = asyncio.Queue()
+        for url in urls:
+            pending.put_nowait(url)
+
+        async with asyncio.TaskGroup() as tg:
+            for _ in range(min(CONFIG.max_concurrency, len(urls))):
+                tg.create_task(self._worker(session, pending, results))
+
+    async def _worker(
+            self,
+            session: aiohttp.ClientSession,
+            pending: asyncio.Queue[str],
+            results: list[CarListing],
+    ) -> None:
+        """Process queued URLs one at a time until the queue is empty."""
+        while True:
+            try:
+                url = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            listing = await self._process_single_listing(session, url)
+            if listing is not None:
+                results.append(listing)
 
     async def _process_single_listing(
             self, session: aiohttp.ClientSession, url: str
@@ -338,6 +535,7 @@ class Scraper:
             if not html:
                 return None
 
+            # Two substring checks beat a regex alternation here: re has no literal prefilter for it
             if "Оголошення не знайдено" in html or "Видалено" in html:
                 logging.info("Skip %s: listing removed", url)
                 return None
@@ -354,3 +552,35 @@ class Scraper:
         except Exception as ex:
             logging.exception(f"Error processing %s {ex}", url)
             return None
+
+
+def _in_script_or_comment(html: str, pos: int) -> bool:
+    """Whether pos lies inside a <script> element or an HTML comment that opens before it."""
+    return (
+        html.rfind("<script", 0, pos) > html.rfind("</script", 0, pos)
+        or html.rfind("<!--", 0, pos) > html.rfind("-->", 0, pos)
+    )
+
+
+def parse_car_fields(html: str, url: str) -> tuple[dict[str, Any], tuple[str | None, str | None, str | None]]:
+    """
+    Extract every listing field that comes from the page itself, plus the IDs needed for the phone lookup.
+    Module-level and free of I/O, so it can be pickled and run in a worker process.
+    """
+    # Most pages never need the tree; build it on first use and at most once.
+    make_soup = cache(lambda: BeautifulSoup(html, "lxml"))
+    found = Scraper._scan_listing(html)
+    image_url, images_count = Scraper._get_images(html)
+
+    fields = {
+        "url": url,
+        "title": Scraper._get_title(html, make_soup),
+        "price_usd": Scraper._get_price_usd(found, html, make_soup),
+        "odometer": Scraper._get_odometer(found, html),
+        "username": Scraper._get_username(found),
+        "image_url": image_url,
+        "images_count": images_count,
+        "car_number": Scraper._get_car_number(html),
+        "car_vin": Scraper._get_car_vin(found),
+    }
+    return fields, Scraper._get_phone_ids(found, url)